@@ -44,6 +44,11 @@ function initializeUploadPage() {
             });
             
             if (!res.ok) {
+                // Busy/queue-full responses carry a JSON message with a retry hint
+                if (res.status === 429 || res.status === 503) {
+                    const body = await res.json().catch(() => ({}));
+                    throw new Error(body.message || `Server busy (status ${res.status})`);
+                }
                 throw new Error(`HTTP error! status: ${res.status}`);
             }
             
@@ -64,8 +69,13 @@ function initializeUploadPage() {
                     if (line.startsWith('data: ')) {
                         try {
                             const data = JSON.parse(line.slice(6));
+                            if (data.primary_pin) {
+                                pinReadsToPrimary(data.primary_pin);
+                            }
                             
-                            if (data.type === 'progress') {
+                            if (data.type === 'queued') {
+                                showQueuePosition(data);
+                            } else if (data.type === 'progress') {
                                 updateProgress(data);
                             } else if (data.type === 'complete') {
                                 showProgressContainer(false);
@@ -147,6 +157,24 @@ function initializeUploadPage() {
         });
     }
     
+    function showQueuePosition(data) {
+        const batchInfo = document.getElementById('batch-info');
+        const rowsInfo = document.getElementById('rows-info');
+        
+        if (!batchInfo || !rowsInfo) return;
+        
+        batchInfo.textContent = `Queued: position ${data.position}`;
+        rowsInfo.textContent = data.eta_seconds != null
+            ? `Estimated wait: ~${Math.ceil(data.eta_seconds)}s`
+            : 'Waiting for other uploads to finish...';
+    }
+    
+    function pinReadsToPrimary(pin) {
+        // The upload's rows were committed after the response headers (and their
+        // pin cookie) went out; keep reading from the primary until replicas catch up
+        document.cookie = `${pin.cookie}=${pin.until}; max-age=${pin.max_age}; path=/; samesite=lax`;
+    }
+
     function updateProgress(data) {
         const progressBar = document.getElementById('progress-bar');
         const batchInfo = document.getElementById('batch-info');
@@ -1,18 +1,42 @@
+import time
+# Taken before the imports below so cold-start timings include them
+_PROCESS_STARTED = time.time()
 import flask
+import click
 from flask import Flask
-from flask import request, jsonify, render_template, Response, send_from_directory
+from flask import request, jsonify, render_template, Response, g, stream_with_context
 from io import StringIO
 import csv
 from flask_cors import CORS   
+from werkzeug.utils import safe_join
+from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.dialects.postgresql import insert
-from sqlalchemy import func, create_engine
+from sqlalchemy import func, create_engine, text, select, delete, update, tuple_, literal, union_all
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateIndex
+from flask_sqlalchemy.query import Query as FlaskQuery
 import os
 import json
-import requests
-from datetime import datetime
-import psutil
+from datetime import datetime, timedelta
+import base64
+import gzip
+import hashlib
+import math
+import mimetypes
+import re
 import gc
+import threading
+import functools
+import itertools
+from collections import deque
+from queue import Queue, Empty, Full
+from concurrent.futures import ThreadPoolExecutor, as_completed
+try:
+    import brotli  # Optional: enables Content-Encoding: br
+except ImportError:
+    brotli = None
 # Database configuration from environment variables
 DATABASE_USERNAME = os.getenv('DATABASE_USERNAME', 'postgres')
 DATABASE_PASSWORD = os.getenv('DATABASE_PASSWORD', '')
@@ -21,20 +45,28 @@ DATABASE_HOST = os.getenv('DATABASE_HOST', 'localhost')
 DATABASE_PORT = os.getenv('DATABASE_PORT', '5432')
 
 app = Flask(__name__)
+# Number of reverse proxies in front of the app (Render adds one). Only that
+# many X-Forwarded-For entries are trusted when setting request.remote_addr;
+# set to 0 when clients connect directly.
+TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', 1))
+if TRUSTED_PROXY_HOPS > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS)
 # Configure static file serving - but API routes will be matched first
 app.static_folder = 'Frontend'
 app.static_url_path = ''
 
-# Construct database URI
-if os.getenv('DATABASE_URL'):
-    # Use DATABASE_URL if provided (common in cloud deployments)
-    # Convert postgres:// to postgresql+psycopg:// for psycopg3 compatibility
-    database_url = os.getenv('DATABASE_URL')
+def _normalize_database_url(database_url):
+    """Convert postgres:// and postgresql:// URLs to postgresql+psycopg:// for psycopg3 compatibility."""
     if database_url.startswith('postgres://'):
         database_url = database_url.replace('postgres://', 'postgresql+psycopg://', 1)
     elif database_url.startswith('postgresql://'):
         database_url = database_url.replace('postgresql://', 'postgresql+psycopg://', 1)
-    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    return database_url
+
+# Construct database URI
+if os.getenv('DATABASE_URL'):
+    # Use DATABASE_URL if provided (common in cloud deployments)
+    app.config['SQLALCHEMY_DATABASE_URI'] = _normalize_database_url(os.getenv('DATABASE_URL'))
 else:
     # Construct from individual components - use psycopg3 driver
     app.config['SQLALCHEMY_DATABASE_URI'] = f'postgresql+psycopg://{DATABASE_USERNAME}:{DATABASE_PASSWORD}@{DATABASE_HOST}:{DATABASE_PORT}/{DATABASE_NAME}'
@@ -63,15 +95,55 @@ except (ImportError, AttributeError):
 db = SQLAlchemy(app)
 CORS(app)
 
+# Optional read replicas (comma-separated URLs). Each replica gets its own
+# engine and connection pool; read-only routes go through run_read().
+DATABASE_REPLICA_URLS = [
+    _normalize_database_url(url.strip())
+    for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url.strip()
+]
+READ_YOUR_WRITES_SECONDS = float(os.getenv('READ_YOUR_WRITES_SECONDS', 5))
+REPLICA_RETRY_SECONDS = float(os.getenv('REPLICA_RETRY_SECONDS', 30))
+PRIMARY_PIN_COOKIE = 'fulfil_primary_until'
+
+replica_engines = [create_engine(url, **app.config['SQLALCHEMY_ENGINE_OPTIONS']) for url in DATABASE_REPLICA_URLS]
+# Flask-SQLAlchemy's Query class so replica queries still support .paginate()
+ReplicaSession = sessionmaker(query_cls=FlaskQuery)
+_replica_down_until = {}
+_replica_cursor = itertools.count()
+
+# Route inactive products to product_archive (see ProductArchive)
+ARCHIVE_INACTIVE_PRODUCTS = os.getenv('ARCHIVE_INACTIVE_PRODUCTS', 'False').lower() == 'true'
+
 class Product(db.Model):
         SKU = db.Column(db.String(80), primary_key=True)
         Name = db.Column(db.String(80), unique=False)
         Description = db.Column(db.String(500), unique=False)
         IsActive = db.Column(db.Boolean, default=True)
+        # Partial indexes: listings filtered on IsActive walk only the matching rows in
+        # SKU order. Name and Description stay unindexed so upload upserts can be HOT
+        # updates. With archiving on, product holds no inactive rows to index.
+        __table_args__ = (
+            db.Index('ix_product_active_sku', 'SKU', postgresql_where=IsActive.is_(True)),
+            *([] if ARCHIVE_INACTIVE_PRODUCTS else [
+                db.Index('ix_product_inactive_sku', 'SKU', postgresql_where=IsActive.is_(False)),
+            ]),
+        )
 
         def __repr__(self):
             return '<User %r>' % self.Name
 
+class ProductArchive(db.Model):
+        # Inactive products are moved here when ARCHIVE_INACTIVE_PRODUCTS is enabled,
+        # keeping the product table (and its indexes) sized to the active catalog
+        __tablename__ = 'product_archive'
+        SKU = db.Column(db.String(80), primary_key=True)
+        Name = db.Column(db.String(80), unique=False)
+        Description = db.Column(db.String(500), unique=False)
+        IsActive = db.Column(db.Boolean, default=False)
+
+        def __repr__(self):
+            return '<ProductArchive %r>' % self.Name
+
 class Webhook(db.Model):
         id = db.Column(db.Integer, primary_key=True)
         url = db.Column(db.String(500), nullable=False)
@@ -97,39 +169,609 @@ class Webhook(db.Model):
                 'last_test_response_time': self.last_test_response_time
             }
 
-with app.app_context():
-    db.create_all()
+class WebhookEvent(db.Model):
+        # Log of product events (created, updated, uploaded, deleted), kept separate
+        # from the Webhook subscriptions table and trimmed by compact_event_logs()
+        __table_args__ = (
+            db.Index('ix_webhook_event_type_created_at', 'event_type', 'created_at'),
+            db.Index('ix_webhook_event_created_at', 'created_at'),
+        )
+        id = db.Column(db.BigInteger, primary_key=True)
+        event_type = db.Column(db.String(100), nullable=False)
+        url = db.Column(db.String(500), nullable=False)
+        created_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.utcnow())
+
+        def __repr__(self):
+            return f'<WebhookEvent {self.id}: {self.event_type}>'
+        
+        def to_dict(self):
+            return {
+                'id': self.id,
+                'event_type': self.event_type,
+                'url': self.url,
+                'created_at': self.created_at.isoformat() if self.created_at else None
+            }
+
+class ProductChange(db.Model):
+        # Append-only log of product writes; id is the sequence number clients resume from on /changes
+        id = db.Column(db.BigInteger, primary_key=True)
+        op = db.Column(db.String(40), nullable=False)
+        sku = db.Column(db.String(80), nullable=True)
+        count = db.Column(db.Integer, default=1)
+        created_at = db.Column(db.DateTime, default=lambda: datetime.utcnow())
+
+        def __repr__(self):
+            return f'<ProductChange {self.id}: {self.op}>'
+        
+        def to_dict(self):
+            return {
+                'seq': self.id,
+                'op': self.op,
+                'sku': self.sku,
+                'count': self.count,
+                'created_at': self.created_at.isoformat() if self.created_at else None
+            }
+
+class CatalogVersion(db.Model):
+        # Single-row counter bumped inside every product write transaction (see
+        # record_product_change). The row lock is held until commit, so versions
+        # increase in commit order and can back ETags, unlike product_change ids.
+        __tablename__ = 'catalog_version'
+        id = db.Column(db.Integer, primary_key=True)
+        version = db.Column(db.BigInteger, nullable=False, default=0)
+
+        def __repr__(self):
+            return f'<CatalogVersion {self.version}>'
+
+def _pick_replica():
+    """Return a healthy replica engine for this request, or None to read from the primary.
+
+    The choice is made once per request and kept on flask.g, so all reads in
+    a request (e.g. the catalog version and the page it validates) come from
+    the same database.
+    """
+    if 'read_engine' not in g:
+        g.read_engine = _choose_replica()
+    return g.read_engine
+
+def _choose_replica():
+    """Round-robin over healthy replicas.
+
+    Clients that wrote recently carry a pin cookie and read from the primary
+    until it expires, so they always see their own writes.
+    """
+    if not replica_engines:
+        return None
+    try:
+        pinned_until = float(request.cookies.get(PRIMARY_PIN_COOKIE, 0))
+    except ValueError:
+        pinned_until = 0
+    now = time.time()
+    if pinned_until > now:
+        return None
+    start = next(_replica_cursor)
+    for offset in range(len(replica_engines)):
+        engine = replica_engines[(start + offset) % len(replica_engines)]
+        if _replica_down_until.get(engine, 0) <= now:
+            return engine
+    return None
+
+def run_read(fn):
+    """Run fn(session) for a read-only query on a replica if possible, else on the primary.
+
+    If the replica cannot be reached it is skipped for REPLICA_RETRY_SECONDS
+    and the query is retried on the primary.
+    """
+    engine = _pick_replica()
+    if engine is None:
+        return fn(db.session)
+    session = ReplicaSession(bind=engine)
+    try:
+        return fn(session)
+    except OperationalError as e:
+        _replica_down_until[engine] = time.time() + REPLICA_RETRY_SECONDS
+        g.read_engine = None  # Rest of the request reads from the primary too
+        print(f"Replica {engine.url.host} unavailable, falling back to primary: {str(e)}")
+        session.rollback()
+        return fn(db.session)
+    finally:
+        session.close()
+
+@app.after_request
+def pin_writers_to_primary(response):
+    """After a successful write, pin the client's reads to the primary for READ_YOUR_WRITES_SECONDS."""
+    if replica_engines and request.method in ('POST', 'PUT', 'DELETE') and response.status_code < 400:
+        response.set_cookie(
+            PRIMARY_PIN_COOKIE,
+            str(time.time() + READ_YOUR_WRITES_SECONDS),
+            max_age=int(READ_YOUR_WRITES_SECONDS) + 1,
+            samesite='Lax'
+        )
+    return response
+
+def primary_pin_fields():
+    """Extra SSE event fields re-pinning the client to the primary when a streamed write finishes.
+
+    The cookie above goes out with the response headers, so for streams that
+    keep writing (uploads) it can expire before the last batch commits. The
+    final event carries a fresh expiry for the client to store instead.
+    """
+    if not replica_engines:
+        return {}
+    return {'primary_pin': {
+        'cookie': PRIMARY_PIN_COOKIE,
+        'until': time.time() + READ_YOUR_WRITES_SECONDS,
+        'max_age': int(READ_YOUR_WRITES_SECONDS) + 1
+    }}
+
+CHANGE_CHANNEL = 'product_changes'
+CHANGE_REPLAY_LIMIT = int(os.getenv('CHANGE_REPLAY_LIMIT', 1000))
+CHANGE_COALESCE_SECONDS = float(os.getenv('CHANGE_COALESCE_SECONDS', 1.0))
+
+def record_product_change(op, sku=None, count=1):
+    """Log a product write, bump the catalog version and NOTIFY /changes listeners in the caller's transaction.
+
+    The caller commits; PostgreSQL only delivers the notification on commit,
+    so subscribers never see changes that were rolled back.
+    """
+    table = CatalogVersion.__table__
+    stmt = insert(table).values(id=1, version=1)
+    db.session.execute(stmt.on_conflict_do_update(index_elements=['id'], set_={'version': table.c.version + 1}))
+    change = ProductChange(op=op, sku=sku, count=count, created_at=datetime.utcnow())
+    db.session.add(change)
+    db.session.flush()  # Assign the sequence number
+    db.session.execute(
+        text('SELECT pg_notify(:channel, :payload)'),
+        {'channel': CHANGE_CHANNEL, 'payload': json.dumps(change.to_dict())}
+    )
+    return change
+
+class ChangeFeed:
+    """One LISTEN connection per worker, fanned out to /changes subscribers.
+
+    The listener thread starts with the first subscriber, and subscribe()
+    returns once LISTEN is active, so a subscriber's replay query cannot miss
+    a change committed before notifications start flowing. Each subscriber
+    gets a bounded queue; a subscriber that falls too far behind is dropped
+    and told to resync rather than slowing down the others.
+    """
+    def __init__(self, channel, max_pending=1000, listen_timeout=10):
+        self.channel = channel
+        self.max_pending = max_pending
+        self.listen_timeout = listen_timeout
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_seq = None
+        self._listening = threading.Event()
+
+    def subscribe(self):
+        """Register a subscriber and wait until the listener is receiving notifications."""
+        subscriber = {'queue': Queue(maxsize=self.max_pending), 'resync': None}
+        with self._lock:
+            self._subscribers.append(subscriber)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen, name='change-feed', daemon=True)
+                self._thread.start()
+        if not self._listening.wait(self.listen_timeout):
+            subscriber['resync'] = 'change feed is not connected'
+        return subscriber
 
-def create_webhook_entry(event_type, route="", enabled=True):
-    """Helper function to create a webhook entry in the database.
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def _publish(self, event):
+        self._last_seq = max(self._last_seq or 0, event['seq'])
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber['queue'].put_nowait(event)
+            except Full:
+                subscriber['resync'] = 'subscriber fell behind'
+                self.unsubscribe(subscriber)
+
+    def _resync_all(self, reason):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self._subscribers.clear()
+        for subscriber in subscribers:
+            subscriber['resync'] = reason
+
+    def _catch_up(self):
+        """After LISTEN, publish changes committed since _last_seq while we were not listening."""
+        with app.app_context():
+            missed = ProductChange.query.filter(ProductChange.id > self._last_seq).order_by(ProductChange.id).limit(CHANGE_REPLAY_LIMIT + 1).all()
+            if len(missed) > CHANGE_REPLAY_LIMIT:
+                self._last_seq = db.session.query(func.max(ProductChange.id)).scalar() or 0
+                self._resync_all('change feed missed too many changes while reconnecting')
+                return
+            for change in missed:
+                self._publish(change.to_dict())
+
+    def _listen(self):
+        while True:
+            try:
+                with app.app_context():
+                    # NOTIFY is not replicated, so always listen on the primary
+                    dsn = db.engine.url.set(drivername='postgresql').render_as_string(hide_password=False)
+                    if self._last_seq is None:
+                        # Seed before LISTEN; the catch-up below covers anything committed in between
+                        self._last_seq = db.session.query(func.max(ProductChange.id)).scalar() or 0
+                with psycopg.connect(dsn, autocommit=True) as conn:
+                    conn.execute(f'LISTEN {self.channel}')
+                    self._catch_up()
+                    self._listening.set()
+                    for notify in conn.notifies():
+                        self._publish(json.loads(notify.payload))
+            except Exception as e:
+                self._listening.clear()
+                print(f"Change feed listener error, reconnecting: {str(e)}")
+                time.sleep(2)
+
+change_feed = ChangeFeed(CHANGE_CHANNEL)
+
+EVENT_BASE_URL = "https://fulfil-5fsi.onrender.com"
+
+def create_webhook_entry(event_type, route=""):
+    """Helper function to record a webhook event in the event log.
     
     Args:
         event_type: The type of event (e.g., "product created", "product updated")
         route: The route path (e.g., "/delete", "/insert_by_sku")
-        enabled: Whether the webhook is enabled (default: True)
     """
     try:
         # Construct full URL from base URL and route
-        base_url = "https://fulfil-5fsi.onrender.com"
-        url = f"{base_url}{route}" if route else base_url
+        url = f"{EVENT_BASE_URL}{route}" if route else EVENT_BASE_URL
         
-        webhook = Webhook(
+        event = WebhookEvent(
             url=url,
-            event_type=event_type,
-            enabled=enabled
+            event_type=event_type
         )
-        db.session.add(webhook)
+        db.session.add(event)
         db.session.commit()
-        return webhook
+        return event
     except Exception as e:
         db.session.rollback()
-        # Don't fail the main operation if webhook creation fails
-        print(f"Error creating webhook entry: {str(e)}")
+        # Don't fail the main operation if event logging fails
+        print(f"Error creating webhook event: {str(e)}")
         return None
 
+def migrate_legacy_webhook_events():
+    """Move auto-generated event rows out of the webhook subscriptions table.
+
+    Older versions logged every product event as a Webhook row pointing at
+    EVENT_BASE_URL; those rows belong in webhook_event. The match would also
+    catch untested subscriptions pointing at this app's own host, so this is
+    a one-time upgrade step (`init-db --migrate-legacy-events`), never run
+    automatically.
+    """
+    moved = db.session.execute(
+        text(
+            f'WITH moved AS ('
+            f'  DELETE FROM {Webhook.__tablename__}'
+            f'  WHERE url LIKE :prefix AND last_test_at IS NULL'
+            f'  RETURNING event_type, url, created_at'
+            f') INSERT INTO {WebhookEvent.__tablename__} (event_type, url, created_at)'
+            f' SELECT event_type, url, COALESCE(created_at, now()) FROM moved'
+        ),
+        {'prefix': f'{EVENT_BASE_URL}%'}
+    ).rowcount
+    db.session.commit()
+    return moved
+
+# Retention for the append-only logs; 0 disables a limit
+WEBHOOK_EVENT_RETENTION_DAYS = int(os.getenv('WEBHOOK_EVENT_RETENTION_DAYS', 30))
+WEBHOOK_EVENT_MAX_ROWS = int(os.getenv('WEBHOOK_EVENT_MAX_ROWS', 100000))
+CHANGE_LOG_MAX_ROWS = int(os.getenv('CHANGE_LOG_MAX_ROWS', 100000))
+COMPACTION_INTERVAL_SECONDS = int(os.getenv('COMPACTION_INTERVAL_SECONDS', 600))
+COMPACTION_BATCH_SIZE = 5000
+COMPACTION_LOCK_KEY = 7300421  # pg advisory lock so only one worker compacts at a time
+
+def _delete_in_batches(conn, table, condition):
+    total = 0
+    while True:
+        ids = select(table.c.id).where(condition).order_by(table.c.id).limit(COMPACTION_BATCH_SIZE)
+        deleted = conn.execute(delete(table).where(table.c.id.in_(ids))).rowcount
+        conn.commit()
+        total += deleted
+        if deleted < COMPACTION_BATCH_SIZE:
+            return total
+
+def compact_event_logs():
+    """Apply time and count retention to webhook_event and product_change.
+
+    Deletes in small batches so the tables stay writable. Returns rows deleted
+    per table, or None if another worker holds the compaction lock.
+    """
+    deleted = {'webhook_event': 0, 'product_change': 0}
+    with db.engine.connect() as conn:
+        if not conn.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': COMPACTION_LOCK_KEY}).scalar():
+            conn.rollback()
+            return None
+        try:
+            events = WebhookEvent.__table__
+            if WEBHOOK_EVENT_RETENTION_DAYS > 0:
+                cutoff = datetime.utcnow() - timedelta(days=WEBHOOK_EVENT_RETENTION_DAYS)
+                deleted['webhook_event'] += _delete_in_batches(conn, events, events.c.created_at < cutoff)
+            for table, max_rows in ((events, WEBHOOK_EVENT_MAX_ROWS), (ProductChange.__table__, CHANGE_LOG_MAX_ROWS)):
+                if max_rows <= 0:
+                    continue
+                # Newest id beyond the limit; everything at or below it goes
+                threshold = conn.execute(select(table.c.id).order_by(table.c.id.desc()).offset(max_rows).limit(1)).scalar()
+                if threshold is not None:
+                    deleted[table.name] += _delete_in_batches(conn, table, table.c.id <= threshold)
+        finally:
+            conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': COMPACTION_LOCK_KEY})
+            conn.commit()
+    return deleted
+
+def _compaction_loop():
+    while True:
+        time.sleep(COMPACTION_INTERVAL_SECONDS)
+        try:
+            with app.app_context():
+                result = compact_event_logs()
+            if result and any(result.values()):
+                print(f"Compacted event logs: {result}")
+        except Exception as e:
+            print(f"Error compacting event logs: {str(e)}")
+
+if COMPACTION_INTERVAL_SECONDS > 0:
+    threading.Thread(target=_compaction_loop, name='log-compaction', daemon=True).start()
+
+PRODUCT_COLUMNS = '"SKU", "Name", "Description", "IsActive"'
+
+def sync_product_archive():
+    """Move products to the table ARCHIVE_INACTIVE_PRODUCTS says they belong in.
+
+    With archiving on, inactive rows move from product to product_archive;
+    with it off, archived rows move back. Returns the number of rows moved.
+    Run by `flask init-db` after the setting changes.
+    """
+    if ARCHIVE_INACTIVE_PRODUCTS:
+        source, target, condition = Product.__tablename__, ProductArchive.__tablename__, 'NOT "IsActive"'
+    else:
+        source, target, condition = ProductArchive.__tablename__, Product.__tablename__, 'TRUE'
+    moved = db.session.execute(text(
+        f'WITH moved AS (DELETE FROM {source} WHERE {condition} RETURNING {PRODUCT_COLUMNS})'
+        f' INSERT INTO {target} ({PRODUCT_COLUMNS}) SELECT {PRODUCT_COLUMNS} FROM moved'
+        f' ON CONFLICT ("SKU") DO UPDATE SET "Name" = EXCLUDED."Name",'
+        f' "Description" = EXCLUDED."Description", "IsActive" = EXCLUDED."IsActive"'
+    )).rowcount
+    db.session.commit()
+    return moved
+
+def _product_models(is_active=None):
+    """Models that may hold products with the given IsActive value (None for any)."""
+    if not ARCHIVE_INACTIVE_PRODUCTS or is_active is True:
+        return [Product]
+    if is_active is False:
+        # product holds no inactive rows (and has no index for them) when archiving
+        return [ProductArchive]
+    return [Product, ProductArchive]
+
+def _product_model_for(is_active):
+    """Model a product with the given IsActive value is stored in."""
+    return ProductArchive if ARCHIVE_INACTIVE_PRODUCTS and not is_active else Product
+
+def _find_products(session, **filters):
+    """filter_by() across product and, when archiving, product_archive."""
+    products = []
+    for model in _product_models():
+        products.extend(session.query(model).filter_by(**filters).all())
+    return products
+
+def _list_products(session, is_active=None, after=None, limit=500, offset=0):
+    """Product rows ordered by SKU, optionally filtered by IsActive and starting after a SKU.
+
+    Each table is read through an index in SKU order with the limit pushed
+    down, so the cost follows the page size rather than the catalog size.
+    When filtering on IsActive the column is selected as a constant, so the
+    partial index on that value serves the filter and the ordering.
+    """
+    selects = []
+    for model in _product_models(is_active):
+        is_active_column = model.IsActive if is_active is None else literal(is_active)
+        stmt = select(model.SKU, model.Name, model.Description, is_active_column.label('IsActive'))
+        if is_active is not None and model is Product:
+            stmt = stmt.where(model.IsActive.is_(is_active))
+        if after is not None:
+            stmt = stmt.where(model.SKU > after)
+        selects.append(stmt.order_by(model.SKU).limit(offset + limit))
+    if len(selects) == 1:
+        stmt = selects[0].limit(limit).offset(offset)
+    else:
+        merged = union_all(*[stmt.subquery().select() for stmt in selects]).subquery()
+        stmt = select(merged).order_by(merged.c.SKU).limit(limit).offset(offset)
+    return session.execute(stmt).all()
+
+def _count_products(session):
+    return sum(session.query(func.count()).select_from(model).scalar() for model in _product_models())
+
+# Schema initialization mode:
+#   startup - create tables and migrate at import (default)
+#   lazy    - do it once, on the first request that needs the database
+#   off     - never automatically; run `flask --app app init-db` before starting
+SCHEMA_INIT = os.getenv('SCHEMA_INIT', 'startup').lower()
+SCHEMA_LOCK_KEY = 7300422  # pg advisory lock so workers don't race on CREATE TABLE
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+def _unbuilt_indexes(conn):
+    """(index, exists) for model indexes that are missing or were left invalid by an interrupted build."""
+    valid = dict(conn.execute(text(
+        'SELECT c.relname, i.indisvalid FROM pg_index i'
+        ' JOIN pg_class c ON c.oid = i.indexrelid'
+        ' JOIN pg_namespace n ON n.oid = c.relnamespace'
+        ' WHERE n.nspname = current_schema()'
+    )).all())
+    return [
+        (index, index.name in valid)
+        for table in db.metadata.sorted_tables for index in table.indexes
+        if not valid.get(index.name)
+    ]
+
+def build_missing_indexes():
+    """Build indexes that create_all() skipped because their table already existed.
+
+    Uses CREATE INDEX CONCURRENTLY so the table stays writable during the
+    build. On a large catalog this can take minutes, so it runs from
+    `flask init-db` rather than at worker startup. Returns the names built.
+    """
+    built = []
+    with db.engine.connect() as conn:
+        # CONCURRENTLY cannot run inside a transaction block
+        conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+        for index, exists in _unbuilt_indexes(conn):
+            if exists:
+                conn.exec_driver_sql(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"')
+            ddl = str(CreateIndex(index).compile(dialect=conn.dialect))
+            conn.exec_driver_sql(ddl.replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1))
+            built.append(index.name)
+    return built
+
+def ensure_schema():
+    """Create missing tables, once per process."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        with db.engine.connect() as conn:
+            conn.execute(text('SELECT pg_advisory_lock(:key)'), {'key': SCHEMA_LOCK_KEY})
+            try:
+                db.create_all()
+                # create_all skips indexes on tables that already exist; building them
+                # here could block writes past the boot timeout, so leave it to init-db
+                unbuilt = _unbuilt_indexes(conn)
+                if unbuilt:
+                    print(f"Indexes not built yet: {', '.join(index.name for index, _ in unbuilt)}. Run `flask --app app init-db` to build them")
+            finally:
+                conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': SCHEMA_LOCK_KEY})
+                conn.commit()
+        _schema_ready = True
+
+@app.cli.command('init-db')
+@click.option('--migrate-legacy-events', is_flag=True,
+              help='Once, when upgrading: move product events logged by older versions from webhook to webhook_event.')
+def init_db_command(migrate_legacy_events):
+    """Create database tables, apply ARCHIVE_INACTIVE_PRODUCTS and build missing indexes."""
+    ensure_schema()
+    # Scans product for inactive rows, so it runs here rather than at every worker boot
+    moved = sync_product_archive()
+    if moved:
+        print(f"Moved {moved} products between product and product_archive")
+    if migrate_legacy_events:
+        print(f"Moved {migrate_legacy_webhook_events()} legacy event rows from webhook to webhook_event")
+    # After ensure_schema() has released its connection: CONCURRENTLY waits for open transactions
+    for name in build_missing_indexes():
+        print(f"Built index {name}")
+    print('Database schema is up to date')
+
+# Endpoints that must answer without touching the database schema
+SCHEMA_EXEMPT_ENDPOINTS = {'healthz', 'index', 'serve_static_files', 'static'}
+
+@app.before_request
+def ensure_schema_before_request():
+    if SCHEMA_INIT == 'lazy' and not _schema_ready and request.endpoint not in SCHEMA_EXEMPT_ENDPOINTS:
+        ensure_schema()
+
+if SCHEMA_INIT == 'startup':
+    with app.app_context():
+        ensure_schema()
+
+# Open this many pooled connections in the background at startup so the
+# first requests don't pay for connection setup (capped at the pool size)
+POOL_WARMUP_CONNECTIONS = int(os.getenv('POOL_WARMUP_CONNECTIONS', 0))
+
+def warm_connection_pools(count):
+    with app.app_context():
+        engines = [db.engine] + replica_engines
+    for engine in engines:
+        connections = []
+        try:
+            for _ in range(min(count, engine.pool.size())):
+                connections.append(engine.connect())
+        except Exception as e:
+            print(f"Error warming connection pool for {engine.url.host}: {str(e)}")
+        finally:
+            # Closing returns them to the pool, ready for reuse
+            for conn in connections:
+                conn.close()
+
+if POOL_WARMUP_CONNECTIONS > 0:
+    threading.Thread(target=warm_connection_pools, args=(POOL_WARMUP_CONNECTIONS,), name='pool-warmup', daemon=True).start()
+
+# Cold-start timings reported by /healthz
+_first_success_ms = None
+
+@app.after_request
+def record_first_success(response):
+    global _first_success_ms
+    if _first_success_ms is None and response.status_code < 400 and request.endpoint != 'healthz':
+        _first_success_ms = round((time.time() - _PROCESS_STARTED) * 1000, 1)
+        print(f"Time to first successful request: {_first_success_ms}ms ({request.path})")
+    return response
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Lightweight health check that never queries the product table.
+
+    Pass ?db=1 to also check database connectivity with SELECT 1.
+    """
+    status = {
+        'status': 'ok',
+        'uptime_seconds': round(time.time() - _PROCESS_STARTED, 1),
+        'startup_ms': _startup_ms,
+        'time_to_first_request_ms': _first_success_ms,
+        'schema_ready': _schema_ready
+    }
+    if request.args.get('db'):
+        try:
+            db.session.execute(text('SELECT 1'))
+            status['database'] = 'ok'
+        except Exception as e:
+            status.update(status='error', database=str(e))
+            return jsonify(status), 503
+    return jsonify(status), 200
+
+# Bounded executor for blocking database work (CSV upsert batches, etc.)
+# Long-running streams hand their DB calls to this pool so that no more than
+# DB_EXECUTOR_WORKERS operations compete for pooled connections at once,
+# however many uploads are streaming. Under the gevent worker the caller's
+# greenlet yields while it waits for the result.
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', 8))
+
+def _make_db_executor():
+    # With gevent's monkey-patching a regular ThreadPoolExecutor runs on greenlets,
+    # so the batch work (statement building, gc) would still block the event loop.
+    # gevent's native pool uses real OS threads and lets the hub keep serving requests.
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+            return NativeThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS)
+    except ImportError:
+        pass
+    return ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix='db')
+
+db_executor = _make_db_executor()
+
+def run_db(fn, *args, **kwargs):
+    """Run fn(*args, **kwargs) on the bounded DB executor inside an app context and return its result."""
+    def task():
+        with app.app_context():
+            return fn(*args, **kwargs)
+    return db_executor.submit(task).result()
+
 def check_memory_limit():
     """Check if memory usage is approaching limits. Returns (is_safe, memory_percent, memory_mb)."""
     try:
+        import psutil  # Loaded on first use to keep startup light
         process = psutil.Process(os.getpid())
         memory_info = process.memory_info()
         memory_percent = process.memory_percent()
@@ -158,18 +800,201 @@ def check_memory_limit():
         # If psutil fails, assume safe (for compatibility)
         return True, 0, 0
 
+class AdmissionRejected(Exception):
+    """Raised when an admission queue is full or a client already has too many queued requests."""
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class AdmissionQueue:
+    """Concurrency limit for one endpoint class with a bounded FIFO wait queue.
+
+    Requests enter() to take a ticket, wait() until their ticket reaches the
+    head of the queue and a slot is free, and leave() when done. Tickets are
+    admitted strictly in arrival order, and each client may hold at most
+    max_per_client tickets, so one caller cannot crowd out the rest.
+    """
+    def __init__(self, name, limit, max_queue, max_wait=None, max_per_client=None, admit_check=None):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_per_client = max_per_client
+        self.admit_check = admit_check  # Extra gate for the head of the queue (e.g. memory)
+        self._cond = threading.Condition()
+        self._waiting = deque()
+        self._active = []
+        self._durations = deque(maxlen=20)
+        self._next_id = 0
+
+    def enter(self, client):
+        with self._cond:
+            if len(self._waiting) >= self.max_queue:
+                raise AdmissionRejected(f'Too many queued {self.name} requests', self._retry_after(len(self._waiting)))
+            if self.max_per_client is not None:
+                held = sum(1 for t in list(self._waiting) + self._active if t['client'] == client)
+                if held >= self.max_per_client:
+                    raise AdmissionRejected(f'Too many {self.name} requests in progress for this client', self._retry_after(len(self._waiting)))
+            self._next_id += 1
+            ticket = {'id': self._next_id, 'client': client, 'queued_at': time.time(), 'started_at': None}
+            self._waiting.append(ticket)
+            return ticket
+
+    def wait(self, ticket, timeout=None):
+        """Block until the ticket is admitted. Returns False if timeout expires first."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while True:
+                if ticket['started_at'] is not None:
+                    return True
+                if self._waiting and self._waiting[0] is ticket and len(self._active) < self.limit:
+                    if self.admit_check is None or self.admit_check():
+                        self._waiting.popleft()
+                        ticket['started_at'] = time.time()
+                        self._active.append(ticket)
+                        self._cond.notify_all()
+                        return True
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                # Wake up periodically so admit_check (memory) is re-evaluated
+                self._cond.wait(1.0 if remaining is None else min(remaining, 1.0))
+
+    def leave(self, ticket):
+        """Release a ticket, whether it was admitted or is still waiting. Safe to call twice."""
+        with self._cond:
+            if ticket in self._active:
+                self._active.remove(ticket)
+                self._durations.append(time.time() - ticket['started_at'])
+            elif ticket in self._waiting:
+                self._waiting.remove(ticket)
+            self._cond.notify_all()
+
+    def position(self, ticket):
+        """1-based position in the wait queue, or 0 once admitted."""
+        with self._cond:
+            try:
+                return list(self._waiting).index(ticket) + 1
+            except ValueError:
+                return 0
+
+    def eta_seconds(self, position):
+        """Rough wait estimate from recent run times: full rounds of `limit` slots ahead of this position."""
+        if position <= 0:
+            return 0
+        if not self._durations:
+            return None
+        average = sum(self._durations) / len(self._durations)
+        return round(((position - 1) // self.limit + 1) * average, 1)
+
+    def _retry_after(self, queued):
+        eta = self.eta_seconds(queued + 1)
+        return max(1, int(eta)) if eta else 5
+
+    def stats(self):
+        with self._cond:
+            return {'active': len(self._active), 'queued': len(self._waiting), 'limit': self.limit, 'max_queue': self.max_queue}
+
+def _memory_is_safe():
+    return check_memory_limit()[0]
+
+# Admission queues for heavy endpoint classes (limits are per worker process).
+# Cheap point reads and single-product writes are never queued; keeping the
+# bulk limits below the worker's capacity leaves them headroom during imports.
+admission_queues = {
+    'upload': AdmissionQueue(
+        'upload',
+        limit=int(os.getenv('UPLOAD_CONCURRENCY', 2)),
+        max_queue=int(os.getenv('UPLOAD_QUEUE_SIZE', 10)),
+        max_per_client=int(os.getenv('UPLOAD_MAX_PER_CLIENT', 2)),
+        max_wait=float(os.getenv('UPLOAD_MAX_WAIT', 600)),
+        admit_check=_memory_is_safe
+    ),
+    'listing': AdmissionQueue(
+        'listing',
+        limit=int(os.getenv('LISTING_CONCURRENCY', 4)),
+        max_queue=int(os.getenv('LISTING_QUEUE_SIZE', 16)),
+        max_wait=float(os.getenv('LISTING_MAX_WAIT', 10)),
+        admit_check=_memory_is_safe
+    ),
+    'delete': AdmissionQueue('delete', limit=1, max_queue=2, max_wait=30),
+}
+
+def _client_key():
+    # remote_addr is the client address as seen by the nearest trusted proxy (see ProxyFix above)
+    return request.remote_addr
+
+def _admission_busy_response(queue, message, retry_after, position=None):
+    response = jsonify({
+        'error': 'Server busy',
+        'message': f'{message}. Please retry in about {retry_after}s.',
+        'queue': queue.name,
+        'position': position,
+        'retry_after': retry_after
+    })
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429 if position is None else 503
+
+def admission_controlled(queue_name):
+    """Route decorator: run the view only once the named admission queue admits the request."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            queue = admission_queues[queue_name]
+            try:
+                ticket = queue.enter(_client_key())
+            except AdmissionRejected as e:
+                return _admission_busy_response(queue, str(e), e.retry_after)
+            try:
+                if not queue.wait(ticket, timeout=queue.max_wait):
+                    position = queue.position(ticket)
+                    return _admission_busy_response(queue, f'Timed out waiting for a {queue.name} slot', queue._retry_after(position), position)
+                return view(*args, **kwargs)
+            finally:
+                queue.leave(ticket)
+        return wrapper
+    return decorator
+
+def catalog_version(session):
+    """Current catalog version from the catalog_version counter row.
+
+    Every product write bumps it, so this changes whenever any product does.
+    It is a primary-key lookup, never a product scan.
+    """
+    return session.query(CatalogVersion.version).filter(CatalogVersion.id == 1).scalar() or 0
+
+def catalog_etag(view):
+    """Route decorator: weak ETag from the catalog version and request URL; answers If-None-Match with 304.
+
+    Goes above admission_controlled so revalidations never wait in a queue.
+    Used on the listing endpoints, where a 304 saves a page query; if the
+    version cannot be read the view runs as usual, without an ETag.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            version = run_read(catalog_version)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error reading catalog version, skipping ETag: {str(e)}")
+            return view(*args, **kwargs)
+        etag = hashlib.sha1(f'{version}|{request.full_path}'.encode()).hexdigest()
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'  # Cache, but revalidate every time
+        return response
+    return wrapper
+
 @app.route('/upload', methods=['POST'])
 def upload_csv():
     if request.method == 'POST':
-        # Check memory before starting
-        is_safe, mem_percent, mem_mb = check_memory_limit()
-        if not is_safe:
-            return jsonify({
-                'error': 'Memory limit reached',
-                'message': f'Server memory usage is too high ({mem_mb:.1f}MB). Please try again later or contact support.',
-                'memory_mb': round(mem_mb, 1)
-            }), 503
-        
+        # Memory is checked by the upload admission queue: while it is too high,
+        # uploads stay queued (with position and ETA) instead of being refused
         if 'csv_file' not in request.files:
             return jsonify({'error': 'No file part'}), 400
             
@@ -191,35 +1016,45 @@ def upload_csv():
                     'file_size_mb': round(file_size / (1024*1024), 1)
                 }), 400
             
-            # Read file content while request context is still active
-            file_content = None
+            # Take a place in the upload queue; processing starts once admitted.
+            # The file is only decoded after admission: until then it stays in
+            # werkzeug's upload buffer (spooled to disk above 500KB), so queued
+            # uploads don't hold their content in memory.
+            upload_queue = admission_queues['upload']
             try:
-                file_content = csv_file.stream.read().decode("UTF-8", errors='ignore')
-                # Check memory after reading file
-                is_safe, mem_percent, mem_mb = check_memory_limit()
-                if not is_safe:
-                    file_content = None  # Clear reference
-                    gc.collect()
-                    return jsonify({
-                        'error': 'Memory limit reached',
-                        'message': f'Server memory usage is too high ({mem_mb:.1f}MB) after reading file. Please try again later.',
-                        'memory_mb': round(mem_mb, 1)
-                    }), 503
-            except Exception as e:
-                return jsonify({'error': 'Error reading file', 'message': str(e)}), 400
+                ticket = upload_queue.enter(_client_key())
+            except AdmissionRejected as e:
+                return _admission_busy_response(upload_queue, str(e), e.retry_after)
             
             # Store file_content in a way that can be accessed and cleaned up in generator
-            file_content_ref = [file_content]  # Use list to allow modification in nested scope
+            file_content_ref = [None]  # Use list to allow modification in nested scope
             
             def generate():
                 # Push application context for the generator
                 with app.app_context():
                     try:
-                        # Get file content from outer scope
+                        # Wait for an upload slot, reporting queue position and ETA meanwhile
+                        deadline = time.time() + upload_queue.max_wait
+                        wait_timeout = 0
+                        while not upload_queue.wait(ticket, timeout=wait_timeout):
+                            position = upload_queue.position(ticket)
+                            if time.time() >= deadline:
+                                yield f"data: {json.dumps({'type': 'error', 'error': 'Server busy', 'message': f'Timed out after waiting {int(upload_queue.max_wait)}s for an upload slot. Please try again later.', 'position': position})}\n\n"
+                                return
+                            yield f"data: {json.dumps({'type': 'queued', 'position': position, 'eta_seconds': upload_queue.eta_seconds(position)})}\n\n"
+                            wait_timeout = min(2, max(0, deadline - time.time()))
+                        
+                        # Admitted: read the file now
+                        try:
+                            file_content_ref[0] = csv_file.stream.read().decode("UTF-8", errors='ignore')
+                        except Exception as e:
+                            yield f"data: {json.dumps({'type': 'error', 'error': 'Error reading file', 'message': str(e)})}\n\n"
+                            return
                         file_content = file_content_ref[0]
-                        if file_content is None:
+                        if not file_content:
                             yield f"data: {json.dumps({'type': 'error', 'error': 'Error processing CSV file', 'message': 'File content is empty'})}\n\n"
                             return
+                        
                         # Reduced batch size for better memory management
                         # Smaller batches = less memory per operation
                         BATCH_SIZE = 250
@@ -248,7 +1083,7 @@ def upload_csv():
                             if batch_count > 0 and batch_count % 3 == 0:
                                 is_safe, mem_percent, mem_mb = check_memory_limit()
                                 if not is_safe:
-                                    yield f"data: {json.dumps({'type': 'error', 'message': f'Memory limit reached during processing ({mem_mb:.1f}MB). Operation aborted. Processed {rows_processed} rows before stopping.', 'memory_mb': round(mem_mb, 1), 'rows_processed': rows_processed})}\n\n"
+                                    yield f"data: {json.dumps({'type': 'error', 'message': f'Memory limit reached during processing ({mem_mb:.1f}MB). Operation aborted. Processed {rows_processed} rows before stopping.', 'memory_mb': round(mem_mb, 1), 'rows_processed': rows_processed, **primary_pin_fields()})}\n\n"
                                     # Clean up
                                     batch.clear()
                                     file_content_ref[0] = None  # Clear file content reference
@@ -268,29 +1103,28 @@ def upload_csv():
                                 # Process in batches for better performance
                                 if len(batch) >= BATCH_SIZE:
                                     try:
-                                        _bulk_upsert_products(batch)
+                                        run_db(_bulk_upsert_products, batch)
                                         batch_count += 1
                                         batch = []
-                                        # Force aggressive garbage collection after every batch
-                                        gc.collect()
+                                        # _bulk_upsert_products already ran a young-generation gc for this batch
                                         # Send progress update
                                         yield f"data: {json.dumps({'type': 'progress', 'total_batches': total_batches, 'current_batch': batch_count, 'total_rows': total_rows, 'rows_processed': rows_processed})}\n\n"
                                     except MemoryError as e:
-                                        yield f"data: {json.dumps({'type': 'error', 'message': str(e), 'rows_processed': rows_processed})}\n\n"
+                                        yield f"data: {json.dumps({'type': 'error', 'message': str(e), 'rows_processed': rows_processed, **primary_pin_fields()})}\n\n"
                                         return
                         
                         # Process remaining rows
                         if batch:
                             try:
-                                _bulk_upsert_products(batch)
+                                run_db(_bulk_upsert_products, batch)
                                 batch_count += 1
                                 yield f"data: {json.dumps({'type': 'progress', 'total_batches': total_batches, 'current_batch': batch_count, 'total_rows': total_rows, 'rows_processed': rows_processed})}\n\n"
                             except MemoryError as e:
-                                yield f"data: {json.dumps({'type': 'error', 'message': str(e), 'rows_processed': rows_processed})}\n\n"
+                                yield f"data: {json.dumps({'type': 'error', 'message': str(e), 'rows_processed': rows_processed, **primary_pin_fields()})}\n\n"
                                 return
                         
                         # Send final success message
-                        yield f"data: {json.dumps({'type': 'complete', 'success': True, 'message': 'CSV uploaded and data saved successfully!', 'rows_processed': rows_processed})}\n\n"
+                        yield f"data: {json.dumps({'type': 'complete', 'success': True, 'message': 'CSV uploaded and data saved successfully!', 'rows_processed': rows_processed, **primary_pin_fields()})}\n\n"
                         
                         # Create webhook entry for product uploaded (bulk) event
                         try:
@@ -306,19 +1140,27 @@ def upload_csv():
                         
                     except Exception as e:
                         db.session.rollback()
-                        yield f"data: {json.dumps({'type': 'error', 'error': 'Error processing CSV file', 'message': str(e)})}\n\n"
+                        yield f"data: {json.dumps({'type': 'error', 'error': 'Error processing CSV file', 'message': str(e), **primary_pin_fields()})}\n\n"
+                    finally:
+                        upload_queue.leave(ticket)
             
-            return Response(generate(), mimetype='text/event-stream')
+            # stream_with_context keeps the request (and its uploaded file) open while streaming
+            response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+            # Also release the slot if the client disconnects before the stream starts
+            response.call_on_close(lambda: upload_queue.leave(ticket))
+            return response
         
         return jsonify({'error': 'Invalid file'}), 400
     
     return jsonify({'error': 'Method not allowed'}), 405
 
 @app.route('/delete', methods=['POST'])
+@admission_controlled('delete')
 def delete_products():
     if request.method == 'POST':
         try:
-            db.session.query(Product).delete()
+            deleted = sum(db.session.query(model).delete() for model in _product_models())
+            record_product_change('deleted_all', count=deleted)
             db.session.commit()
             # Create webhook entry for product deleted event
             create_webhook_entry("product deleted", "/delete")
@@ -335,7 +1177,7 @@ def get_by_sku():
         if not sku:
             return jsonify({'error': 'SKU parameter is required'}), 400
         
-        products = Product.query.filter_by(SKU=sku).all()
+        products = run_read(lambda session: _find_products(session, SKU=sku))
         
         # Convert SQLAlchemy objects to dictionaries for JSON serialization
         products_list = [{
@@ -358,7 +1200,7 @@ def get_by_name():
         name = request.args.get('name')
         if not name:
             return jsonify({'error': 'Name parameter is required'}), 400
-        products = Product.query.filter_by(Name=name).all()
+        products = run_read(lambda session: _find_products(session, Name=name))
 
         products_list = [{
             'SKU': p.SKU,
@@ -375,7 +1217,7 @@ def get_by_description():
         description = request.args.get('description')
         if not description:
             return jsonify({'error': 'Description parameter is required'}), 400
-        products = Product.query.filter_by(Description=description).all()
+        products = run_read(lambda session: _find_products(session, Description=description))
 
         products_list = [{
             'SKU': p.SKU,
@@ -387,49 +1229,52 @@ def get_by_description():
     return jsonify({'error': 'Method not allowed'}), 405
 
 @app.route('/get_all_products', methods=['GET'])
+@catalog_etag
+@admission_controlled('listing')
 def get_all_products():
     if request.method == 'GET':
-        # Check memory before loading all products
-        is_safe, mem_percent, mem_mb = check_memory_limit()
-        if not is_safe:
-            return jsonify({
-                'error': 'Memory limit reached',
-                'message': f'Server memory usage is too high ({mem_mb:.1f}MB). Please try again later.',
-                'memory_mb': round(mem_mb, 1)
-            }), 503
-        
+        # Memory is checked by the listing admission queue before we get here
         try:
             # Use pagination to avoid loading all products at once
             # For large datasets, this prevents memory issues
-            page = request.args.get('page', 1, type=int)
+            page = max(request.args.get('page', 1, type=int), 1)
             per_page = request.args.get('per_page', 500, type=int)  # Reduced default to 500, max 2000
+            # Keyset pagination: pass the previous response's next_after instead of page.
+            # Cost stays flat however deep the client pages, and no total count is run.
+            after = request.args.get('after')
             
             # Limit per_page to prevent memory issues - more conservative
-            per_page = min(per_page, 2000)
+            per_page = max(min(per_page, 2000), 1)
             
-            pagination = Product.query.paginate(
-                page=page, 
-                per_page=per_page, 
-                error_out=False
-            )
+            if after is not None:
+                rows = run_read(lambda session: _list_products(session, after=after, limit=per_page + 1))
+                total_pages = None
+            else:
+                rows, total = run_read(lambda session: (
+                    _list_products(session, limit=per_page + 1, offset=(page - 1) * per_page),
+                    _count_products(session)
+                ))
+                total_pages = (total + per_page - 1) // per_page
+            
+            # If there are more pages, indicate that
+            has_more = len(rows) > per_page
+            rows = rows[:per_page]
             
             products_list = [{
                 'SKU': p.SKU,
                 'Name': p.Name,
                 'Description': p.Description,
                 'IsActive': p.IsActive
-            } for p in pagination.items]
-            
-            # If there are more pages, indicate that
-            has_more = pagination.has_next
+            } for p in rows]
             
             return jsonify({
                 'success': True, 
                 'products': products_list,
-                'page': page,
+                'page': page if after is None else None,
                 'per_page': per_page,
                 'has_more': has_more,
-                'total_pages': pagination.pages if hasattr(pagination, 'pages') else None
+                'next_after': rows[-1].SKU if has_more else None,
+                'total_pages': total_pages
             }), 200
         except Exception as e:
             # Force garbage collection on error
@@ -438,6 +1283,8 @@ def get_all_products():
     return jsonify({'error': 'Method not allowed'}), 405
 
 @app.route('/get_by_is_active', methods=['GET'])
+@catalog_etag
+@admission_controlled('listing')
 def get_by_is_active():
     if request.method == 'GET':
         is_active_param = request.args.get('is_active')
@@ -451,7 +1298,13 @@ def get_by_is_active():
         else:
             is_active_bool = bool(is_active_param)
         
-        products = Product.query.filter_by(IsActive=is_active_bool).all()
+        # Keyset-paginated in SKU order; pass next_after back as ?after= for the next page
+        per_page = max(min(request.args.get('per_page', 500, type=int), 2000), 1)
+        after = request.args.get('after')
+        
+        products = run_read(lambda session: _list_products(session, is_active=is_active_bool, after=after, limit=per_page + 1))
+        has_more = len(products) > per_page
+        products = products[:per_page]
 
         products_list = [{
             'SKU': p.SKU,
@@ -462,7 +1315,9 @@ def get_by_is_active():
         return jsonify({
             'success': True,
             'products': products_list,
-            'count': len(products_list)
+            'count': len(products_list),
+            'has_more': has_more,
+            'next_after': products[-1].SKU if has_more else None
         }), 200
     return jsonify({'error': 'Method not allowed'}), 405
 
@@ -476,16 +1331,26 @@ def update_by_sku():
     if not sku:
         return jsonify(error="SKU is required"), 400
 
-    product = Product.query.filter_by(SKU=sku).first()
-    if not product:
+    products = _find_products(db.session, SKU=sku)
+    if not products:
         return jsonify(error="Product with given SKU not found"), 404
+    product = products[0]
 
     # Update fields if provided
     product.Name = data.get('Name', product.Name)
     product.Description = data.get('Description', product.Description)
     product.IsActive = data.get('IsActive', product.IsActive)
 
+    # Activating or deactivating may move the row between product and product_archive
+    target_model = _product_model_for(product.IsActive)
+    if not isinstance(product, target_model):
+        moved = target_model(SKU=product.SKU, Name=product.Name, Description=product.Description, IsActive=product.IsActive)
+        db.session.delete(product)
+        db.session.flush()
+        db.session.add(moved)
+
     try:
+        record_product_change('updated', sku)
         db.session.commit()
         # Create webhook entry for product updated event
         create_webhook_entry("product updated", "/update_by_sku")
@@ -502,19 +1367,21 @@ def insert_by_sku():
     if not sku:
         return jsonify(error="SKU is required"), 400
 
-    existing = Product.query.filter_by(SKU=sku).first()
+    existing = _find_products(db.session, SKU=sku)
     if existing:
         return jsonify(error="Product with this SKU already exists"), 400
 
-    new_product = Product(
+    is_active = data.get('IsActive', True)
+    new_product = _product_model_for(is_active)(
         SKU=sku,
         Name=data.get('Name', ''),
         Description=data.get('Description', ''),
-        IsActive=data.get('IsActive', True)
+        IsActive=is_active
     )
     db.session.add(new_product)
 
     try:
+        record_product_change('created', sku)
         db.session.commit()
         # Create webhook entry for product created event
         create_webhook_entry("product created", "/insert_by_sku")
@@ -530,12 +1397,14 @@ def delete_by_sku():
     if not sku:
         return jsonify(error="SKU is required"), 400
 
-    product = Product.query.filter_by(SKU=sku).first()
-    if not product:
+    products = _find_products(db.session, SKU=sku)
+    if not products:
         return jsonify(error="Product with given SKU not found"), 404
+    product = products[0]
 
     try:
         db.session.delete(product)
+        record_product_change('deleted', sku)
         db.session.commit()
         return jsonify(success=True, message="Product deleted successfully"), 200
     except Exception as e:
@@ -544,6 +1413,95 @@ def delete_by_sku():
 
 
 
+@app.route('/changes', methods=['GET'])
+def stream_changes():
+    """Server-Sent Events feed of product changes.
+
+    Pass ?since=<seq> (or the Last-Event-ID header, which EventSource sends on
+    reconnect) to replay changes after that sequence number first. Consecutive
+    upload batch events are coalesced into one summary event.
+    """
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        since = int(since) if since is not None else None
+    except ValueError:
+        return jsonify({'error': 'since must be an integer sequence number'}), 400
+    
+    def format_event(event):
+        return f"id: {event['seq']}\ndata: {json.dumps(dict(event, type='change'))}\n\n"
+    
+    def generate():
+        # Subscribe before replaying so nothing committed in between is lost
+        subscriber = change_feed.subscribe()
+        # Changes committed after subscribe() can arrive both in the replay and on the queue
+        replayed = set()
+        
+        def receive(timeout):
+            """Next queued event not already sent by the replay; raises Empty on timeout."""
+            deadline = time.time() + timeout
+            while True:
+                event = subscriber['queue'].get(timeout=max(0, deadline - time.time()))
+                if event['seq'] not in replayed:
+                    return event
+        
+        try:
+            with app.app_context():
+                if since is None:
+                    latest = db.session.query(func.max(ProductChange.id)).scalar() or 0
+                    yield f"data: {json.dumps({'type': 'ready', 'seq': latest})}\n\n"
+                else:
+                    # Retention may have deleted the start of the range; a gap before the
+                    # oldest kept row means changes would be skipped silently
+                    oldest = db.session.query(func.min(ProductChange.id)).scalar()
+                    if oldest is not None and since < oldest - 1:
+                        yield f"data: {json.dumps({'type': 'resync', 'reason': 'changes since last seq were compacted'})}\n\n"
+                    else:
+                        missed = ProductChange.query.filter(ProductChange.id > since).order_by(ProductChange.id).limit(CHANGE_REPLAY_LIMIT + 1).all()
+                        if len(missed) > CHANGE_REPLAY_LIMIT:
+                            # Too far behind to replay; the client should reload its data
+                            yield f"data: {json.dumps({'type': 'resync', 'reason': 'too many changes since last seq'})}\n\n"
+                        else:
+                            for change in missed:
+                                replayed.add(change.id)
+                                yield format_event(change.to_dict())
+            # Leaving the app context returns the session's connection to the pool
+            
+            while True:
+                if subscriber['resync']:
+                    yield f"data: {json.dumps({'type': 'resync', 'reason': subscriber['resync']})}\n\n"
+                    return
+                try:
+                    event = receive(15)
+                except Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                
+                if event['op'] == 'upserted':
+                    # Fold further upload batches arriving within the window into one summary
+                    deadline = time.time() + CHANGE_COALESCE_SECONDS
+                    batches = 1
+                    while True:
+                        try:
+                            following = receive(max(0, deadline - time.time()))
+                        except Empty:
+                            break
+                        if following['op'] != 'upserted':
+                            yield format_event(dict(event, batches=batches))
+                            event, batches = following, 0
+                            break
+                        event = dict(following, count=event['count'] + following['count'])
+                        batches += 1
+                    if event['op'] == 'upserted':
+                        event = dict(event, batches=batches)
+                yield format_event(event)
+        finally:
+            change_feed.unsubscribe(subscriber)
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # Webhook initialization endpoint (to ensure table exists)
 @app.route('/webhooks/init', methods=['POST'])
 def init_webhooks():
@@ -558,8 +1516,9 @@ def init_webhooks():
 # Webhook endpoints
 @app.route('/webhooks', methods=['GET'])
 def get_webhooks():
+    # Subscriptions only; product events are listed (and paginated) by /webhooks/events
     try:
-        webhooks = Webhook.query.all()
+        webhooks = run_read(lambda session: session.query(Webhook).order_by(Webhook.id).all())
         return jsonify({
             'success': True,
             'webhooks': [w.to_dict() for w in webhooks]
@@ -572,6 +1531,65 @@ def get_webhooks():
         print(traceback_str)
         return jsonify({'error': 'Error fetching webhooks', 'message': error_msg}), 500
 
+def _encode_event_cursor(event):
+    raw = f"{event.created_at.isoformat()}|{event.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_event_cursor(cursor):
+    created_at, event_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(created_at), int(event_id)
+
+@app.route('/webhooks/events', methods=['GET'])
+def get_webhook_events():
+    """List logged product events, newest first, with keyset pagination.
+
+    Query parameters: event_type, since, until (ISO datetimes), limit (max 500)
+    and cursor (the next_cursor of the previous page).
+    """
+    event_type = request.args.get('event_type')
+    limit = max(min(request.args.get('limit', 100, type=int), 500), 1)
+    try:
+        since = datetime.fromisoformat(request.args['since']) if request.args.get('since') else None
+        until = datetime.fromisoformat(request.args['until']) if request.args.get('until') else None
+        cursor = _decode_event_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': 'Invalid query parameter', 'message': str(e)}), 400
+    
+    def query_events(session):
+        query = session.query(WebhookEvent)
+        if event_type:
+            query = query.filter(WebhookEvent.event_type == event_type)
+        if since:
+            query = query.filter(WebhookEvent.created_at >= since)
+        if until:
+            query = query.filter(WebhookEvent.created_at < until)
+        if cursor:
+            query = query.filter(tuple_(WebhookEvent.created_at, WebhookEvent.id) < cursor)
+        return query.order_by(WebhookEvent.created_at.desc(), WebhookEvent.id.desc()).limit(limit + 1).all()
+    
+    try:
+        events = run_read(query_events)
+        has_more = len(events) > limit
+        events = events[:limit]
+        return jsonify({
+            'success': True,
+            'events': [e.to_dict() for e in events],
+            'next_cursor': _encode_event_cursor(events[-1]) if has_more else None
+        }), 200
+    except Exception as e:
+        return jsonify({'error': 'Error fetching webhook events', 'message': str(e)}), 500
+
+@app.route('/webhooks/events/compact', methods=['POST'])
+def compact_webhook_events():
+    """Run event log retention now instead of waiting for the background job."""
+    try:
+        deleted = compact_event_logs()
+        if deleted is None:
+            return jsonify({'success': False, 'message': 'Compaction already running in another worker'}), 409
+        return jsonify({'success': True, 'deleted': deleted}), 200
+    except Exception as e:
+        return jsonify({'error': 'Error compacting event logs', 'message': str(e)}), 500
+
 @app.route('/webhooks', methods=['POST'])
 def create_webhook():
     data = request.get_json()
@@ -647,9 +1665,40 @@ def delete_webhook(webhook_id):
         db.session.rollback()
         return jsonify({'error': 'Error deleting webhook', 'message': str(e)}), 500
 
+WEBHOOK_TEST_TIMEOUT = 10
+WEBHOOK_TEST_CONCURRENCY = int(os.getenv('WEBHOOK_TEST_CONCURRENCY', 10))
+WEBHOOK_TEST_MAX_CONCURRENCY = 50
+
+def _send_test_webhook(http, webhook_id, url):
+    """POST the test payload to url. Returns (response, response_time_ms); raises requests exceptions."""
+    test_payload = {
+        'event': 'webhook.test',
+        'timestamp': datetime.now().isoformat(),
+        'data': {
+            'message': 'This is a test webhook call',
+            'webhook_id': webhook_id
+        }
+    }
+    start_time = time.time()
+    response = http.post(
+        url,
+        json=test_payload,
+        headers={'Content-Type': 'application/json'},
+        timeout=WEBHOOK_TEST_TIMEOUT
+    )
+    response_time = (time.time() - start_time) * 1000  # Convert to milliseconds
+    return response, response_time
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
 @app.route('/webhooks/<int:webhook_id>/test', methods=['POST'])
 def test_webhook(webhook_id):
-    import time
+    import requests
     
     webhook = Webhook.query.get(webhook_id)
     
@@ -657,25 +1706,8 @@ def test_webhook(webhook_id):
         return jsonify({'error': 'Webhook not found'}), 404
     
     try:
-        # Prepare test payload
-        test_payload = {
-            'event': 'webhook.test',
-            'timestamp': datetime.now().isoformat(),
-            'data': {
-                'message': 'This is a test webhook call',
-                'webhook_id': webhook_id
-            }
-        }
-        
         # Send webhook request
-        start_time = time.time()
-        response = requests.post(
-            webhook.url,
-            json=test_payload,
-            headers={'Content-Type': 'application/json'},
-            timeout=10
-        )
-        response_time = (time.time() - start_time) * 1000  # Convert to milliseconds
+        response, response_time = _send_test_webhook(requests, webhook_id, webhook.url)
         
         # Update webhook with test results
         webhook.last_test_at = datetime.now()
@@ -708,6 +1740,135 @@ def test_webhook(webhook_id):
         db.session.rollback()
         return jsonify({'error': 'Error testing webhook', 'message': str(e)}), 500
 
+@app.route('/webhooks/test_all', methods=['POST'])
+def test_all_webhooks():
+    """Send test payloads to all enabled webhooks concurrently, streaming results as SSE.
+
+    Optional JSON body: ids (list of webhook ids), event_type, concurrency.
+    Each finished test is sent as a 'result' event; the stream ends with a
+    'summary' event holding the latency distribution. last_test_* columns are
+    updated in a single batched write once all tests finish.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        concurrency = int(data.get('concurrency', WEBHOOK_TEST_CONCURRENCY))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'concurrency must be an integer'}), 400
+    concurrency = max(1, min(concurrency, WEBHOOK_TEST_MAX_CONCURRENCY))
+    ids = data.get('ids')
+    if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)):
+        return jsonify({'error': 'ids must be a list of integer webhook ids'}), 400
+    event_type = data.get('event_type')
+    if event_type is not None and not isinstance(event_type, str):
+        return jsonify({'error': 'event_type must be a string'}), 400
+    
+    try:
+        query = Webhook.query.filter(Webhook.enabled.is_(True))
+        if ids is not None:
+            query = query.filter(Webhook.id.in_(ids))
+        if event_type:
+            query = query.filter(Webhook.event_type == event_type)
+        targets = [(w.id, w.url) for w in query.order_by(Webhook.id).all()]
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Error loading webhooks', 'message': str(e)}), 500
+    
+    import requests
+    from requests.adapters import HTTPAdapter
+    
+    def generate():
+        # One session for the whole fan-out so connections to the same host are reused
+        http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        http.mount('http://', adapter)
+        http.mount('https://', adapter)
+        
+        def run_test(webhook_id, url):
+            result = {'webhook_id': webhook_id, 'url': url, 'status_code': None, 'response_time': None}
+            try:
+                response, response_time = _send_test_webhook(http, webhook_id, url)
+                result.update(success=True, status_code=response.status_code, response_time=round(response_time, 2))
+            except requests.exceptions.Timeout:
+                result.update(success=False, error='Webhook request timed out')
+            except requests.exceptions.RequestException as e:
+                result.update(success=False, error=f'Webhook request failed: {str(e)}')
+            return result
+        
+        yield f"data: {json.dumps({'type': 'start', 'total': len(targets), 'concurrency': concurrency})}\n\n"
+        
+        results = []
+        
+        def save_results():
+            # Record all responses in one batched UPDATE (failed requests keep their previous values, as in test_webhook)
+            tested_at = datetime.now()
+            updates = [{
+                'id': r['webhook_id'],
+                'last_test_at': tested_at,
+                'last_test_status': r['status_code'],
+                'last_test_response_time': r['response_time']
+            } for r in results if r['success']]
+            if not updates:
+                return
+            with app.app_context():
+                try:
+                    db.session.execute(update(Webhook), updates)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
+        
+        started = time.time()
+        pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='webhook-test')
+        finished = False
+        try:
+            futures = [pool.submit(run_test, webhook_id, url) for webhook_id, url in targets]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                yield f"data: {json.dumps(dict(result, type='result'))}\n\n"
+            finished = True
+        finally:
+            # If the client disconnected, don't wait for (or start) the remaining tests
+            pool.shutdown(wait=False, cancel_futures=True)
+            http.close()
+            if not finished:
+                try:
+                    save_results()  # Keep the results gathered before the stream ended
+                except Exception as e:
+                    print(f"Error saving webhook test results: {str(e)}")
+        
+        try:
+            save_results()
+        except Exception as e:
+            yield f"data: {json.dumps({'type': 'error', 'error': 'Error saving test results', 'message': str(e)})}\n\n"
+        
+        latencies = sorted(r['response_time'] for r in results if r['success'])
+        status_counts = {}
+        for r in results:
+            key = str(r['status_code']) if r['success'] else 'failed'
+            status_counts[key] = status_counts.get(key, 0) + 1
+        summary = {
+            'type': 'summary',
+            'total': len(results),
+            'succeeded': len(latencies),
+            'failed': len(results) - len(latencies),
+            'status_counts': status_counts,
+            'elapsed_ms': round((time.time() - started) * 1000, 2),
+            'latency_ms': {
+                'min': latencies[0] if latencies else None,
+                'mean': round(sum(latencies) / len(latencies), 2) if latencies else None,
+                'p50': _percentile(latencies, 50),
+                'p90': _percentile(latencies, 90),
+                'p95': _percentile(latencies, 95),
+                'p99': _percentile(latencies, 99),
+                'max': latencies[-1] if latencies else None
+            },
+            **primary_pin_fields()
+        }
+        yield f"data: {json.dumps(summary)}\n\n"
+    
+    return Response(generate(), mimetype='text/event-stream')
+
 @app.route('/webhooks/<int:webhook_id>/toggle', methods=['POST'])
 def toggle_webhook(webhook_id):
     webhook = Webhook.query.get(webhook_id)
@@ -757,19 +1918,32 @@ def _bulk_upsert_products(batch):
         for item in deduplicated_batch:
             item['SKU'] = item['SKU'].upper()
         
-        # Use PostgreSQL's INSERT ... ON CONFLICT (upsert) for much faster processing
-        # Note: This requires SKU column to be case-insensitive or use UPPER(SKU) in index
-        stmt = insert(Product).values(deduplicated_batch)
-        stmt = stmt.on_conflict_do_update(
-            index_elements=['SKU'],
-            set_=dict(
-                Name=stmt.excluded.Name,
-                Description=stmt.excluded.Description,
-                IsActive=stmt.excluded.IsActive
+        # Route rows to product or product_archive by IsActive (a single table unless archiving)
+        rows_by_model = {}
+        for item in deduplicated_batch:
+            rows_by_model.setdefault(_product_model_for(item['IsActive']), []).append(item)
+        
+        for model, rows in rows_by_model.items():
+            # Use PostgreSQL's INSERT ... ON CONFLICT (upsert) for much faster processing
+            # Note: This requires SKU column to be case-insensitive or use UPPER(SKU) in index
+            stmt = insert(model).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['SKU'],
+                set_=dict(
+                    Name=stmt.excluded.Name,
+                    Description=stmt.excluded.Description,
+                    IsActive=stmt.excluded.IsActive
+                )
             )
-        )
+            db.session.execute(stmt)
+            
+            if ARCHIVE_INACTIVE_PRODUCTS:
+                # Drop any copy in the other table (e.g. an archived SKU re-uploaded as active)
+                other = ProductArchive if model is Product else Product
+                db.session.execute(delete(other).where(other.SKU.in_([row['SKU'] for row in rows])))
         
-        db.session.execute(stmt)
+        # One summary change per batch rather than one per row
+        record_product_change('upserted', count=len(deduplicated_batch))
         db.session.commit()
         
         # Clear batch from memory
@@ -783,29 +1957,149 @@ def _bulk_upsert_products(batch):
         db.session.rollback()
         raise
     finally:
-        # Force garbage collection after batch processing
-        gc.collect()
+        # One young-generation collection per batch, on the executor thread; full
+        # collections are left to check_memory_limit() when memory runs high
+        gc.collect(1)
+
+# Response compression for API responses (static files use precompressed variants below)
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/javascript', 'text/javascript', 'text/css', 'text/html', 'text/plain'}
+
+def _preferred_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+@app.after_request
+def compress_response(response):
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _preferred_encoding()
+    if encoding is None:
+        return response
+    response.set_data(_compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
 
 # Serve frontend files - must be after all API routes
+FRONTEND_ROOT = os.path.join(app.root_path, 'Frontend')
+# API endpoints (no file extension) that must never fall through to static serving
+API_PATHS = {'upload', 'delete', 'get_all_products', 'get_by_sku', 'get_by_name',
+             'get_by_description', 'get_by_is_active', 'update_by_sku', 'insert_by_sku',
+             'delete_by_sku', 'changes', 'healthz'}
+# Map lowercase (from frontend) to capitalized (actual) subdirectory names
+FRONTEND_DIRS = {'upload': 'Upload', 'manage': 'Manage', 'delete': 'Delete', 'webhooks': 'Webhooks'}
+STATIC_MAX_AGE = 31536000  # One year, for fingerprinted (?v=) requests
+_ASSET_REFERENCE = re.compile(r'(href|src)="([^"?#:]+\.(?:css|js))"')
+_static_cache = {}
+_static_cache_lock = threading.Lock()
+
+def _static_entry(relative_path, transform=None):
+    """Return the cached body, hash and precompressed variants for a Frontend file (None if missing).
+
+    Entries are built on first request and rebuilt if the file's mtime changes.
+    A transform returns (body, dependencies), where dependencies maps each
+    referenced file to the hash it was built with; the entry is also rebuilt
+    when any of those files changes.
+    """
+    full_path = safe_join(FRONTEND_ROOT, relative_path)
+    if full_path is None or not os.path.isfile(full_path):
+        return None
+    mtime = os.path.getmtime(full_path)
+    cache_key = (relative_path, transform)
+    entry = _static_cache.get(cache_key)
+    if entry is not None and entry['mtime'] == mtime and _dependencies_unchanged(entry):
+        return entry
+    with open(full_path, 'rb') as f:
+        body = f.read()
+    dependencies = {}
+    if transform is not None:
+        body, dependencies = transform(body)
+    mimetype = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    variants = {None: body}
+    if mimetype in COMPRESSIBLE_MIMETYPES and len(body) >= COMPRESS_MIN_SIZE:
+        variants['gzip'] = _compress(body, 'gzip')
+        if brotli is not None:
+            variants['br'] = _compress(body, 'br')
+    entry = {
+        'mtime': mtime,
+        'mimetype': mimetype,
+        'hash': hashlib.sha1(body).hexdigest()[:16],
+        'variants': variants,
+        'dependencies': dependencies
+    }
+    with _static_cache_lock:
+        _static_cache[cache_key] = entry
+    return entry
+
+def _dependencies_unchanged(entry):
+    for relative_path, digest in entry['dependencies'].items():
+        dependency = _static_entry(relative_path)
+        if (dependency['hash'] if dependency else None) != digest:
+            return False
+    return True
+
+def _serve_static_entry(entry):
+    encoding = _preferred_encoding()
+    if encoding not in entry['variants']:
+        encoding = None
+    etag = entry['hash'] + (f'-{encoding}' if encoding else '')
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(entry['variants'][encoding], mimetype=entry['mimetype'])
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    if len(entry['variants']) > 1:
+        response.vary.add('Accept-Encoding')
+    if request.args.get('v') == entry['hash']:
+        # URL carries the content hash, so it can never change under the client
+        response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def _fingerprint_asset_references(html):
+    """Append ?v=<content hash> to local CSS/JS references so they can be cached as immutable.
+
+    Returns the rewritten HTML and the referenced files with the hashes used.
+    """
+    dependencies = {}
+    def add_version(match):
+        entry = _static_entry(match.group(2))
+        dependencies[match.group(2)] = entry['hash'] if entry else None
+        if entry is None:
+            return match.group(0)
+        return f'{match.group(1)}="{match.group(2)}?v={entry["hash"]}"'
+    html = _ASSET_REFERENCE.sub(add_version, html.decode('utf-8')).encode('utf-8')
+    return html, dependencies
+
 @app.route('/')
 def index():
-    return send_from_directory('Frontend', 'main.html')
+    return _serve_static_entry(_static_entry('main.html', transform=_fingerprint_asset_references))
 
 # Serve static files from Frontend directory and subdirectories
 # This route handles all static files (CSS, JS, HTML) while avoiding API routes
 @app.route('/<path:filepath>')
 def serve_static_files(filepath):
-    # List of API route prefixes to exclude (only exact matches, case-sensitive)
-    # These are actual API endpoints, not file paths
-    api_paths = ['upload', 'delete', 'get_all_products', 'get_by_sku', 'get_by_name', 
-                 'get_by_description', 'get_by_is_active', 'update_by_sku', 'insert_by_sku',
-                 'delete_by_sku']
-    
     # If it's an API route, return 404 (API routes are defined above)
     # Only check if it's NOT a file (no extension) and matches API path exactly
     first_segment = filepath.split('/')[0].lower()
-    # Check if it's an API route (no file extension and matches API path)
-    if '.' not in filepath and first_segment in [p.lower() for p in api_paths]:
+    if '.' not in filepath and first_segment in API_PATHS:
         return jsonify({'error': 'Not found'}), 404
     
     # Check for webhooks API routes (but allow Webhooks/ directory for static files)
@@ -816,32 +2110,23 @@ def serve_static_files(filepath):
     
     # Serve files from Frontend directory or subdirectories
     try:
-        # Check if it's a subdirectory file (upload/filename, manage/filename, etc.)
-        # Handle both lowercase (from frontend) and capitalized (actual directory names)
-        if '/' in filepath:
-            parts = filepath.split('/')
-            if len(parts) == 2:
-                # Map lowercase to capitalized directory names
-                dir_mapping = {
-                    'upload': 'Upload',
-                    'manage': 'Manage',
-                    'delete': 'Delete',
-                    'webhooks': 'Webhooks'
-                }
-                # Check both lowercase and capitalized
-                dir_name = parts[0]
-                actual_dir = dir_mapping.get(dir_name.lower(), dir_name)
-                
-                # Check if directory exists (case-insensitive)
-                if actual_dir in ['Upload', 'Manage', 'Delete', 'Webhooks']:
-                    return send_from_directory(f'Frontend/{actual_dir}', parts[1])
+        relative_path = filepath
+        # Subdirectory file (upload/filename, manage/filename, etc.), either case
+        parts = filepath.split('/')
+        if len(parts) == 2 and parts[0].lower() in FRONTEND_DIRS:
+            relative_path = f'{FRONTEND_DIRS[parts[0].lower()]}/{parts[1]}'
         # Otherwise, serve from root Frontend directory (styles.css, config.js, script.js, etc.)
-        return send_from_directory('Frontend', filepath)
+        entry = _static_entry(relative_path)
+        if entry is None:
+            return jsonify({'error': 'Not found'}), 404
+        return _serve_static_entry(entry)
     except Exception as e:
         # Log error for debugging
         print(f"Error serving static file {filepath}: {e}")
         return jsonify({'error': 'Not found'}), 404
 
+_startup_ms = round((time.time() - _PROCESS_STARTED) * 1000, 1)
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
     host = os.getenv('HOST', '0.0.0.0')
@@ -0,0 +1,17 @@
+# Gunicorn configuration
+# The default worker class is gevent: each request (including long-running
+# /upload SSE streams and outbound webhook tests) runs in a greenlet that
+# yields on socket I/O instead of pinning an OS thread. Set
+# GUNICORN_WORKER_CLASS=gthread to fall back to the old threaded workers.
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gevent')
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+
+if worker_class == 'gevent':
+    # Maximum number of simultaneous clients (greenlets) per worker
+    worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 100))
+else:
+    threads = int(os.getenv('GUNICORN_THREADS', 2))
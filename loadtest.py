@@ -0,0 +1,129 @@
+"""Load test: lookup latency while several CSV uploads are streaming.
+
+Usage:
+    python loadtest.py --base-url http://127.0.0.1:5000 --uploads 2 --rows 20000
+
+Measures /get_by_sku latency on an idle server, then again while --uploads
+concurrent /upload SSE streams are running, and prints both distributions.
+With the gevent worker (see gunicorn.conf.py) the two should stay close.
+All uploads come from this one client, so for more than UPLOAD_MAX_PER_CLIENT
+(default 2) start the server with that limit raised.
+
+    python loadtest.py --base-url https://... --cold-start
+
+Instead polls a sleeping instance until /get_all_products answers and reports
+the time to first successful request, plus the server's own /healthz timings.
+"""
+import argparse
+import statistics
+import threading
+import time
+
+import requests
+
+
+def build_csv(rows, prefix):
+    lines = ['name,sku,description']
+    for i in range(rows):
+        lines.append(f'Product {i},{prefix}-{i:07d},Load test product {i}')
+    return '\n'.join(lines).encode('utf-8')
+
+
+def run_upload(base_url, payload, name, results):
+    start = time.time()
+    events = 0
+    with requests.post(f'{base_url}/upload', files={'csv_file': (name, payload, 'text/csv')}, stream=True, timeout=600) as response:
+        for line in response.iter_lines():
+            if line.startswith(b'data:'):
+                events += 1
+    results.append({'name': name, 'status': response.status_code, 'seconds': time.time() - start, 'events': events})
+
+
+def sample_lookups(base_url, sku, stop_event, samples, interval):
+    session = requests.Session()
+    while not stop_event.is_set():
+        start = time.time()
+        session.get(f'{base_url}/get_by_sku', params={'sku': sku}, timeout=30)
+        samples.append((time.time() - start) * 1000)
+        time.sleep(interval)
+
+
+def describe(samples):
+    if not samples:
+        return 'no samples'
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return (f'n={len(ordered)} p50={statistics.median(ordered):.1f}ms '
+            f'p95={p95:.1f}ms max={ordered[-1]:.1f}ms')
+
+
+def measure_cold_start(base_url, timeout):
+    start = time.time()
+    attempts = 0
+    while time.time() - start < timeout:
+        attempts += 1
+        try:
+            response = requests.get(f'{base_url}/get_all_products', params={'per_page': 1}, timeout=timeout)
+            if response.ok:
+                break
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.5)
+    else:
+        print(f'no successful response within {timeout}s')
+        return
+    print(f'time to first successful request (client): {(time.time() - start) * 1000:.0f}ms after {attempts} attempt(s)')
+    health = requests.get(f'{base_url}/healthz', timeout=30).json()
+    print(f"server startup: {health.get('startup_ms')}ms, first successful request: {health.get('time_to_first_request_ms')}ms after process start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--uploads', type=int, default=2, help='concurrent uploads')
+    parser.add_argument('--rows', type=int, default=20000, help='rows per uploaded CSV')
+    parser.add_argument('--baseline-seconds', type=float, default=5.0)
+    parser.add_argument('--interval', type=float, default=0.05, help='pause between lookups')
+    parser.add_argument('--sku', default='LOADTEST-0000000')
+    parser.add_argument('--cold-start', action='store_true', help='measure time to first successful request instead')
+    parser.add_argument('--cold-start-timeout', type=float, default=300)
+    args = parser.parse_args()
+
+    if args.cold_start:
+        measure_cold_start(args.base_url, args.cold_start_timeout)
+        return
+
+    # Idle baseline
+    stop_event = threading.Event()
+    baseline = []
+    sampler = threading.Thread(target=sample_lookups, args=(args.base_url, args.sku, stop_event, baseline, args.interval))
+    sampler.start()
+    time.sleep(args.baseline_seconds)
+    stop_event.set()
+    sampler.join()
+
+    # Lookups while uploads stream
+    stop_event = threading.Event()
+    loaded = []
+    upload_results = []
+    sampler = threading.Thread(target=sample_lookups, args=(args.base_url, args.sku, stop_event, loaded, args.interval))
+    uploaders = [
+        threading.Thread(target=run_upload, args=(args.base_url, build_csv(args.rows, f'LOADTEST{n}'), f'loadtest-{n}.csv', upload_results))
+        for n in range(args.uploads)
+    ]
+    sampler.start()
+    for t in uploaders:
+        t.start()
+    for t in uploaders:
+        t.join()
+    stop_event.set()
+    sampler.join()
+
+    print(f'lookup latency (idle):            {describe(baseline)}')
+    print(f'lookup latency ({args.uploads} uploads streaming): {describe(loaded)}')
+    for result in upload_results:
+        print(f"  {result['name']}: HTTP {result['status']}, {result['seconds']:.1f}s, {result['events']} SSE events")
+
+
+if __name__ == '__main__':
+    main()